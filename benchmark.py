@@ -1,19 +1,33 @@
 #!/usr/bin/env python3
 """Benchmark comparison between Rust and TypeScript Elm LSP servers"""
 
-import subprocess
-import json
+import multiprocessing
 import os
 import time
-import threading
-import queue
-import re
-import sys
+import math
+import statistics
+
+from lsp_client import LspClient, encode_lsp
 
 # Paths
 RUST_LSP = "./target/release/elm_lsp"
 TS_LSP = os.path.expanduser("~/projects/elm-lsp-plugin/server/node_modules/@charlontank/elm-language-server/out/node/index.js")
 
+# Server commands
+RUST_CMD = (RUST_LSP,)
+TS_CMD = ("node", TS_LSP, "--stdio")
+
+# Environment for every server we spawn, built once
+SERVER_ENV = {**os.environ, "RUST_LOG": "error"}  # Minimize logging
+
+# Adaptive sampling: keep timing an op until the 95% confidence interval of
+# its mean is within TARGET_CI of its median, between these iteration bounds
+MIN_ITERATIONS = 5
+MAX_ITERATIONS = 50
+TARGET_CI = 0.05
+
+PUBLISH_DIAGNOSTICS = "textDocument/publishDiagnostics"
+
 # Test Elm source - a more realistic file
 ELM_SOURCE = '''module Main exposing (main, Model, Msg(..), init, update, view)
 
@@ -152,41 +166,88 @@ main =
         }
 '''
 
-def encode_lsp(obj):
-    content = json.dumps(obj)
-    return f"Content-Length: {len(content)}\r\n\r\n{content}"
-
-def read_responses(stdout, response_queue, stop_event):
-    buffer = ""
-    while not stop_event.is_set():
-        try:
-            chunk = stdout.read(1)
-            if not chunk:
-                break
-            buffer += chunk
-            while "Content-Length:" in buffer:
-                match = re.search(r'Content-Length: (\d+)\r?\n\r?\n', buffer)
-                if not match:
-                    break
-                length = int(match.group(1))
-                header_end = match.end()
-                if len(buffer) >= header_end + length:
-                    content = buffer[header_end:header_end + length]
-                    buffer = buffer[header_end + length:]
-                    try:
-                        response_queue.put(json.loads(content))
-                    except:
-                        pass
-                else:
-                    break
-        except:
-            break
-
-def benchmark_lsp(name, cmd, uri, iterations=5):
+def start_server(cmd):
+    # Timed with perf_counter, so waits can take deadlines from the same
+    # clock as the measurements. Only diagnostics are ever waited on; every
+    # other notification is dropped unparsed
+    return LspClient(cmd, env=SERVER_ENV, capture_stderr=False,
+                     keep_notifications=(PUBLISH_DIAGNOSTICS,), clock=time.perf_counter)
+
+def time_op(client, msg, request_id, timeout):
+    """Send a request and return the ms until its response (inf on timeout)"""
+    # Every iteration reuses the pre-encoded id: a late response to an earlier
+    # send that timed out must not be taken for this one
+    client.drain()
+    client.responses.pop(request_id, None)
+    start = time.perf_counter()
+    client.send(msg)
+    if client.wait(request_id, deadline=start + timeout) is None:
+        return float('inf')
+    return (time.perf_counter() - start) * 1000
+
+def time_sync(client, uri, version, *msgs):
+    """Send document sync messages that bring uri to version and return the ms
+    until the server has parsed the file, which it signals by publishing
+    diagnostics for it (inf on timeout)"""
+    def for_uri(message):
+        return message.get("params", {}).get("uri") == uri
+
+    def for_this_change(message):
+        # Servers that report the version let us skip publishes for older ones
+        return for_uri(message) and message["params"].get("version") in (None, version)
+
+    # Servers may publish more than once per change: drop what earlier syncs
+    # left behind so it can't end this one early
+    client.discard_notifications(PUBLISH_DIAGNOSTICS, for_uri)
+    start = time.perf_counter()
+    client.send(*msgs)
+    if client.wait_for_notification(PUBLISH_DIAGNOSTICS, deadline=start + 5,
+                                    match=for_this_change) is None:
+        return float('inf')
+    return (time.perf_counter() - start) * 1000
+
+def run_ops(client, uri, version, requests, time_did_change=True):
+    """Send one didChange, timed unless time_did_change is false, and then
+    time every request once; returns {op: ms}"""
+    # Bump the version so the server can't answer from a stale cache
+    did_change_msg = encode_lsp({"jsonrpc": "2.0", "method": "textDocument/didChange", "params": {
+        "textDocument": {"uri": uri, "version": version},
+        "contentChanges": [{"text": ELM_SOURCE}]
+    }})
+    times = {}
+    if time_did_change:
+        times["didChange"] = time_sync(client, uri, version, did_change_msg)
+    else:
+        # No diagnostics to wait for (it timed out before); just send it
+        client.send(did_change_msg)
+    for op, request_id, msg, timeout in requests:
+        times[op] = time_op(client, msg, request_id, timeout)
+    return times
+
+def welford(stats, x):
+    """Fold sample x into running (n, mean, M2) statistics"""
+    n, mean, m2 = stats
+    n += 1
+    delta = x - mean
+    mean += delta / n
+    m2 += delta * (x - mean)
+    return n, mean, m2
+
+def converged(stats, median, min_samples=MIN_ITERATIONS):
+    """True once the 95% CI half-width of the mean is within TARGET_CI of the median"""
+    n, mean, m2 = stats
+    if n < max(min_samples, 2):
+        return False
+    stdev = math.sqrt(m2 / (n - 1))
+    return 1.96 * stdev / math.sqrt(n) < TARGET_CI * median
+
+def benchmark_lsp(name, cmd, uri, min_iterations=MIN_ITERATIONS, max_iterations=MAX_ITERATIONS):
     """Run benchmark for an LSP server"""
     results = {
         "startup": [],
         "didOpen": [],
+        "warmup": [],
+        "didChange": [],
         "documentSymbol": [],
         "hover": [],
         "completion": [],
@@ -194,156 +255,127 @@ def benchmark_lsp(name, cmd, uri, iterations=5):
         "references": [],
     }
 
-    for i in range(iterations):
-        print(f"  Iteration {i+1}/{iterations}...", end=" ", flush=True)
-
-        env = os.environ.copy()
-        env["RUST_LOG"] = "error"  # Minimize logging
-
-        # Measure startup
-        start = time.time()
-        proc = subprocess.Popen(
-            cmd,
-            stdin=subprocess.PIPE,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            text=True,
-            env=env
-        )
-
-        response_queue = queue.Queue()
-        stop_event = threading.Event()
-        reader = threading.Thread(target=read_responses, args=(proc.stdout, response_queue, stop_event))
-        reader.start()
-
+    # Every message is identical across iterations, so encode them once
+    initialize_msg = encode_lsp({"jsonrpc": "2.0", "id": 1, "method": "initialize", "params": {"capabilities": {}}})
+    initialized_msg = encode_lsp({"jsonrpc": "2.0", "method": "initialized", "params": {}})
+    did_open_msg = encode_lsp({"jsonrpc": "2.0", "method": "textDocument/didOpen", "params": {
+        "textDocument": {"uri": uri, "languageId": "elm", "version": 1, "text": ELM_SOURCE}
+    }})
+    # (op, request id, encoded request, timeout in seconds)
+    requests = [
+        ("documentSymbol", 2, encode_lsp({"jsonrpc": "2.0", "id": 2, "method": "textDocument/documentSymbol", "params": {
+            "textDocument": {"uri": uri}
+        }}), 5),
+        # hover (on 'update' function, line 52)
+        ("hover", 3, encode_lsp({"jsonrpc": "2.0", "id": 3, "method": "textDocument/hover", "params": {
+            "textDocument": {"uri": uri},
+            "position": {"line": 51, "character": 0}
+        }}), 5),
+        # completion (line 60, after 'model.')
+        ("completion", 4, encode_lsp({"jsonrpc": "2.0", "id": 4, "method": "textDocument/completion", "params": {
+            "textDocument": {"uri": uri},
+            "position": {"line": 59, "character": 20}
+        }}), 10),
+        # definition (on 'model' in update function)
+        ("definition", 5, encode_lsp({"jsonrpc": "2.0", "id": 5, "method": "textDocument/definition", "params": {
+            "textDocument": {"uri": uri},
+            "position": {"line": 53, "character": 10}
+        }}), 5),
+        # references (on 'Model' type)
+        ("references", 6, encode_lsp({"jsonrpc": "2.0", "id": 6, "method": "textDocument/references", "params": {
+            "textDocument": {"uri": uri},
+            "position": {"line": 8, "character": 13},
+            "context": {"includeDeclaration": True}
+        }}), 5),
+    ]
+
+    # One server for the whole run: startup and didOpen are measured once,
+    # then every iteration re-times the same operations on the live session
+    start = time.perf_counter()
+    with start_server(cmd) as client:
         try:
             # Initialize
-            msg = encode_lsp({"jsonrpc": "2.0", "id": 1, "method": "initialize", "params": {"capabilities": {}}})
-            proc.stdin.write(msg)
-            proc.stdin.flush()
+            client.send(initialize_msg)
 
             # Wait for response
-            try:
-                resp = response_queue.get(timeout=10)
-                startup_time = time.time() - start
-                results["startup"].append(startup_time * 1000)
-            except queue.Empty:
-                print("TIMEOUT on initialize")
-                continue
-
-            # Initialized
-            msg = encode_lsp({"jsonrpc": "2.0", "method": "initialized", "params": {}})
-            proc.stdin.write(msg)
-            proc.stdin.flush()
-            time.sleep(0.1)
-
-            # didOpen
-            start = time.time()
-            msg = encode_lsp({"jsonrpc": "2.0", "method": "textDocument/didOpen", "params": {
-                "textDocument": {"uri": uri, "languageId": "elm", "version": 1, "text": ELM_SOURCE}
-            }})
-            proc.stdin.write(msg)
-            proc.stdin.flush()
-            time.sleep(0.3)  # Give time to parse
-            results["didOpen"].append((time.time() - start) * 1000)
-
-            # documentSymbol
-            start = time.time()
-            msg = encode_lsp({"jsonrpc": "2.0", "id": 2, "method": "textDocument/documentSymbol", "params": {
-                "textDocument": {"uri": uri}
-            }})
-            proc.stdin.write(msg)
-            proc.stdin.flush()
-            try:
-                resp = response_queue.get(timeout=5)
-                results["documentSymbol"].append((time.time() - start) * 1000)
-            except queue.Empty:
-                results["documentSymbol"].append(float('inf'))
-
-            # hover (on 'update' function, line 52)
-            start = time.time()
-            msg = encode_lsp({"jsonrpc": "2.0", "id": 3, "method": "textDocument/hover", "params": {
-                "textDocument": {"uri": uri},
-                "position": {"line": 51, "character": 0}
-            }})
-            proc.stdin.write(msg)
-            proc.stdin.flush()
-            try:
-                resp = response_queue.get(timeout=5)
-                results["hover"].append((time.time() - start) * 1000)
-            except queue.Empty:
-                results["hover"].append(float('inf'))
-
-            # completion (line 60, after 'model.')
-            start = time.time()
-            msg = encode_lsp({"jsonrpc": "2.0", "id": 4, "method": "textDocument/completion", "params": {
-                "textDocument": {"uri": uri},
-                "position": {"line": 59, "character": 20}
-            }})
-            proc.stdin.write(msg)
-            proc.stdin.flush()
-            try:
-                resp = response_queue.get(timeout=10)
-                results["completion"].append((time.time() - start) * 1000)
-            except queue.Empty:
-                results["completion"].append(float('inf'))
-
-            # definition (on 'model' in update function)
-            start = time.time()
-            msg = encode_lsp({"jsonrpc": "2.0", "id": 5, "method": "textDocument/definition", "params": {
-                "textDocument": {"uri": uri},
-                "position": {"line": 53, "character": 10}
-            }})
-            proc.stdin.write(msg)
-            proc.stdin.flush()
-            try:
-                resp = response_queue.get(timeout=5)
-                results["definition"].append((time.time() - start) * 1000)
-            except queue.Empty:
-                results["definition"].append(float('inf'))
-
-            # references (on 'Model' type)
-            start = time.time()
-            msg = encode_lsp({"jsonrpc": "2.0", "id": 6, "method": "textDocument/references", "params": {
-                "textDocument": {"uri": uri},
-                "position": {"line": 8, "character": 13},
-                "context": {"includeDeclaration": True}
-            }})
-            proc.stdin.write(msg)
-            proc.stdin.flush()
-            try:
-                resp = response_queue.get(timeout=5)
-                results["references"].append((time.time() - start) * 1000)
-            except queue.Empty:
-                results["references"].append(float('inf'))
-
-            print("OK")
+            if client.wait(1, deadline=start + 10) is None:
+                print(f"  [{name}] TIMEOUT on initialize", flush=True)
+                return results
+            results["startup"].append((time.perf_counter() - start) * 1000)
+
+            # Initialized + didOpen, fused into one write
+            results["didOpen"].append(time_sync(client, uri, 1, initialized_msg, did_open_msg))
+
+            # The first pass over the ops pays cold-cache costs; record its total
+            # on its own so the iterations below report steady state
+            warmup = run_ops(client, uri, 2, requests)
+            results["warmup"].append(sum(warmup.values()))
+
+            # Ops still being sampled; fast, noisy ops need more samples than slow ones
+            active = ["didChange"] + [op for op, *_ in requests]
+            stats = {op: (0, 0.0, 0.0) for op in active}
+            for i in range(max_iterations):
+                # Servers run concurrently, so each iteration reports on one full line
+                label = f"  [{name}] Iteration {i+1}:"
+
+                # didChange is always sent so requests never hit a warm cache, but
+                # only waited on while it is still being sampled
+                times = run_ops(client, uri, i + 3, [r for r in requests if r[0] in active],
+                                time_did_change="didChange" in active)
+                for op in list(active):
+                    ms = times[op]
+                    results[op].append(ms)
+                    if ms == float('inf'):
+                        active.remove(op)  # Timed out: more samples won't help
+                        continue
+                    stats[op] = welford(stats[op], ms)
+                    if converged(stats[op], statistics.median(results[op]), min_iterations):
+                        active.remove(op)
+
+                print(f"{label} OK ({len(active)} ops still sampling)", flush=True)
+                if not active:
+                    break
 
         except Exception as e:
-            print(f"ERROR: {e}")
-        finally:
-            stop_event.set()
-            try:
-                proc.terminate()
-                proc.wait(timeout=1)
-            except:
-                proc.kill()
-            reader.join(timeout=1)
+            print(f"  [{name}] ERROR: {e}", flush=True)
 
     return results
 
-def print_results(name, results):
+def split_cpus():
+    """Split the CPUs available to us in two halves, or (None, None) if we can't"""
+    if not hasattr(os, "sched_getaffinity"):
+        return None, None
+    cpus = sorted(os.sched_getaffinity(0))
+    if len(cpus) < 2:
+        return None, None
+    half = len(cpus) // 2
+    return set(cpus[:half]), set(cpus[half:])
+
+def run_one(job):
+    """Pool worker: pin to the given CPUs (inherited by the server) and benchmark"""
+    name, cmd, uri, cpus = job
+    if cpus:
+        os.sched_setaffinity(0, cpus)
+    return name, benchmark_lsp(name, cmd, uri)
+
+def summarize(times):
+    """(avg, min, max, p50, p95, n) of the non-timeout samples, or None if there are none"""
+    valid = sorted(t for t in times if t != float('inf'))
+    n = len(valid)
+    if not n:
+        return None
+    return (sum(valid) / n, valid[0], valid[-1], valid[n // 2], valid[min(n - 1, int(0.95 * n))], n)
+
+def print_results(name, summaries):
     print(f"\n{'='*60}")
     print(f"  {name}")
     print(f"{'='*60}")
 
-    for op, times in results.items():
-        valid_times = [t for t in times if t != float('inf')]
-        if valid_times:
-            avg = sum(valid_times) / len(valid_times)
-            min_t = min(valid_times)
-            max_t = max(valid_times)
-            print(f"  {op:20s}: avg={avg:8.2f}ms  min={min_t:8.2f}ms  max={max_t:8.2f}ms")
+    for op, summary in summaries.items():
+        if summary:
+            avg, min_t, max_t, p50, p95, n = summary
+            print(f"  {op:20s}: avg={avg:8.2f}ms  min={min_t:8.2f}ms  max={max_t:8.2f}ms"
+                  f"  p50={p50:8.2f}ms  p95={p95:8.2f}ms  n={n}")
         else:
             print(f"  {op:20s}: TIMEOUT/ERROR")
 
@@ -352,7 +384,7 @@ def main():
     print("  Elm LSP Benchmark: Rust vs TypeScript")
     print("=" * 60)
     print(f"\nTest file: {len(ELM_SOURCE)} bytes, ~140 lines")
-    print(f"Iterations: 5")
+    print(f"Iterations: {MIN_ITERATIONS}-{MAX_ITERATIONS} per op (adaptive)")
 
     uri = "file:///benchmark/Main.elm"
 
@@ -366,41 +398,43 @@ def main():
         print(f"\nERROR: TypeScript LSP not found at {TS_LSP}")
         return
 
-    # Benchmark Rust LSP
-    print("\n" + "-" * 60)
-    print("Benchmarking Rust LSP...")
-    print("-" * 60)
-    rust_results = benchmark_lsp("Rust", [RUST_LSP], uri)
-
-    # Benchmark TypeScript LSP (with rootUri)
+    # Benchmark both LSPs at once, each from its own process on its own CPUs
     print("\n" + "-" * 60)
-    print("Benchmarking TypeScript LSP...")
+    print("Benchmarking Rust and TypeScript LSPs...")
     print("-" * 60)
-    # Note: TS LSP needs rootUri to work properly
-    ts_results = benchmark_lsp("TypeScript", ["node", TS_LSP, "--stdio"], uri)
+    rust_cpus, ts_cpus = split_cpus()
+    jobs = [
+        ("Rust", RUST_CMD, uri, rust_cpus),
+        # Note: TS LSP needs rootUri to work properly
+        ("TypeScript", TS_CMD, uri, ts_cpus),
+    ]
+    with multiprocessing.get_context("spawn").Pool(len(jobs)) as pool:
+        all_results = dict(pool.map(run_one, jobs))
+    # Summarize each op once; both the tables and the comparison use these
+    rust_summaries = {op: summarize(times) for op, times in all_results["Rust"].items()}
+    ts_summaries = {op: summarize(times) for op, times in all_results["TypeScript"].items()}
 
     # Print results
-    print_results("Rust Elm LSP", rust_results)
-    print_results("TypeScript Elm LSP (@charlontank/elm-language-server)", ts_results)
+    print_results("Rust Elm LSP", rust_summaries)
+    print_results("TypeScript Elm LSP (@charlontank/elm-language-server)", ts_summaries)
 
     # Comparison
     print(f"\n{'='*60}")
     print("  Comparison (Rust vs TypeScript)")
     print(f"{'='*60}")
 
-    for op in rust_results.keys():
-        rust_valid = [t for t in rust_results[op] if t != float('inf')]
-        ts_valid = [t for t in ts_results[op] if t != float('inf')]
+    for op, rust_summary in rust_summaries.items():
+        ts_summary = ts_summaries.get(op)
 
-        if rust_valid and ts_valid:
-            rust_avg = sum(rust_valid) / len(rust_valid)
-            ts_avg = sum(ts_valid) / len(ts_valid)
+        if rust_summary and ts_summary:
+            rust_avg = rust_summary[0]
+            ts_avg = ts_summary[0]
             if rust_avg > 0:
                 speedup = ts_avg / rust_avg
                 print(f"  {op:20s}: Rust is {speedup:.1f}x {'faster' if speedup > 1 else 'slower'}")
-        elif rust_valid:
+        elif rust_summary:
             print(f"  {op:20s}: TypeScript TIMEOUT, Rust OK")
-        elif ts_valid:
+        elif ts_summary:
             print(f"  {op:20s}: Rust TIMEOUT, TypeScript OK")
         else:
             print(f"  {op:20s}: Both TIMEOUT")
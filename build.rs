@@ -0,0 +1,56 @@
+//! Stamps the binary with ELM_LSP_BUILD_ID, which keys the on-disk package
+//! symbol cache so a new build never serves symbols extracted by an older one.
+
+use std::path::Path;
+use std::process::Command;
+use std::time::{SystemTime, UNIX_EPOCH};
+
+const PLUGIN_MANIFEST: &str = ".claude-plugin/plugin.json";
+
+fn main() {
+    rerun_if_changed("src");
+    rerun_if_changed(PLUGIN_MANIFEST);
+    rerun_if_changed(".git/HEAD");
+    if let Some(head_ref) = git(&["symbolic-ref", "-q", "HEAD"]) {
+        rerun_if_changed(&format!(".git/{head_ref}"));
+    }
+
+    // Releases bump only the plugin version; Cargo.toml stays at 0.1.0
+    let mut id =
+        plugin_version().unwrap_or_else(|| std::env::var("CARGO_PKG_VERSION").unwrap_or_default());
+    if let Some(commit) = git(&["rev-parse", "--short=12", "HEAD"]) {
+        id.push('+');
+        id.push_str(&commit);
+        // Uncommitted source changes: every rebuild gets its own id
+        if git(&["status", "--porcelain", "--untracked-files=no", "--", "src"]).is_some() {
+            let nanos = SystemTime::now()
+                .duration_since(UNIX_EPOCH)
+                .map(|d| d.as_nanos())
+                .unwrap_or_default();
+            id.push_str(&format!(".dirty.{nanos}"));
+        }
+    }
+    println!("cargo:rustc-env=ELM_LSP_BUILD_ID={id}");
+}
+
+/// Watch a path only if it exists: cargo reruns the script on every build for missing ones
+fn rerun_if_changed(path: &str) {
+    if Path::new(path).exists() {
+        println!("cargo:rerun-if-changed={path}");
+    }
+}
+
+/// Trimmed stdout of a successful git command, None if empty or git is unavailable
+fn git(args: &[&str]) -> Option<String> {
+    let output = Command::new("git").args(args).output().ok()?;
+    let stdout = String::from_utf8(output.stdout).ok()?;
+    let stdout = stdout.trim();
+    (output.status.success() && !stdout.is_empty()).then(|| stdout.to_string())
+}
+
+fn plugin_version() -> Option<String> {
+    let manifest = std::fs::read_to_string(PLUGIN_MANIFEST).ok()?;
+    let rest = &manifest[manifest.find("\"version\"")? + "\"version\"".len()..];
+    let rest = &rest[rest.find('"')? + 1..];
+    Some(rest[..rest.find('"')?].to_string())
+}
@@ -0,0 +1,462 @@
+#!/usr/bin/env python3
+"""Minimal LSP client shared by the test and benchmark scripts"""
+
+import subprocess
+import collections
+import itertools
+import json
+import os
+import re
+import sys
+import time
+import selectors
+import socket
+
+try:
+    import fcntl
+except ImportError:  # Not available on Windows
+    fcntl = None
+
+# orjson is optional: it encodes straight to bytes and decodes faster
+try:
+    import orjson
+    json_dumps = orjson.dumps
+    json_loads = orjson.loads
+except ImportError:
+    # Build the encoder and decoder once: json.dumps with any non-default
+    # argument constructs a new JSONEncoder on every call.
+    # Compact separators: fewer bytes through the pipe and for the server to parse
+    _encode = json.JSONEncoder(separators=(",", ":")).encode
+    _decode = json.JSONDecoder().decode
+    def json_dumps(obj):
+        return _encode(obj).encode()
+    def json_loads(data):
+        # LSP bodies are UTF-8; the decoder wants str, and memoryviews have no .decode
+        return _decode(str(data, "utf-8"))
+
+READ_SIZE = 65536
+# Large pipes keep big responses from blocking the server's writes
+PIPE_SIZE = 1 << 20
+F_SETPIPE_SZ = getattr(fcntl, "F_SETPIPE_SZ", 1031)  # Linux only
+# Notifications and server requests put "method" first (responses carry no
+# method), so the head of a body says what it is without decoding it
+_METHOD_HEAD = re.compile(rb'\{\s*(?:"jsonrpc"\s*:\s*"2\.0"\s*,\s*)?"method"\s*:\s*"([^"\\]*)"')
+
+# Socket buffer size for the socketpair transport
+SOCKET_BUFFER = 1 << 20
+# Server log lines kept; older ones are dropped
+STDERR_LINES = 4096
+HAVE_READV = hasattr(os, "readv")  # Not available on Windows
+
+def encode_lsp(obj):
+    """Encode a JSON-RPC message with LSP headers"""
+    body = json_dumps(obj)
+    return b"Content-Length: %d\r\n\r\n%s" % (len(body), body)
+
+def encode_request(req_id, method, params):
+    return encode_lsp({"jsonrpc": "2.0", "id": req_id, "method": method, "params": params})
+
+# hover and definition share one shape that differs only in id,
+# method and position: fill a bytes template instead of building a dict and
+# running it through the JSON encoder for every query
+_POSITION_TMPL = (b'{"jsonrpc":"2.0","id":%d,"method":"%s","params":{"textDocument":{"uri":%s},'
+                  b'"position":{"line":%d,"character":%d}}}')
+
+def encode_position_request(req_id, method, uri_json, line, character):
+    """Encode a position request; uri_json is the URI already JSON encoded"""
+    body = _POSITION_TMPL % (req_id, method, uri_json, line, character)
+    return b"Content-Length: %d\r\n\r\n%s" % (len(body), body)
+
+class LspFramer:
+    """Incremental LSP frame parser.
+
+    A small state machine instead of a regex over the whole buffer: every
+    byte that arrives is examined once, and the header scans jump ahead with
+    bytes.find.
+    """
+
+    SCAN_HEADER, READ_LEN, FIND_EMPTY_LINE, READ_BODY, FILL_BODY = range(5)
+    HEADER = b"Content-Length: "
+    # Bodies this large that are still incomplete get a buffer of their exact
+    # size, filled by read_body, instead of growing the shared buffer chunk
+    # by chunk
+    PREALLOCATE = READ_SIZE
+
+    def __init__(self, decode=json_loads):
+        self.decode = decode  # May return None to drop a message
+        self.buffer = bytearray()
+        self.state = self.SCAN_HEADER
+        self.pos = 0  # First byte not examined yet
+        self.length = 0
+        self.body_start = 0
+        self.body = None
+        self.filled = 0
+
+    def feed(self, data):
+        """Append data and return the decoded messages of every frame it completes"""
+        buffer = self.buffer
+        buffer.extend(data)
+        messages = []
+        consumed = 0
+        # Bodies are decoded straight out of the buffer; it's trimmed once at the end
+        with memoryview(buffer) as view:
+            while True:
+                if self.state == self.SCAN_HEADER:
+                    i = buffer.find(self.HEADER, self.pos)
+                    if i == -1:
+                        # Keep enough bytes to match a header split across reads
+                        self.pos = max(self.pos, len(buffer) - len(self.HEADER) + 1)
+                        break
+                    self.pos = i + len(self.HEADER)
+                    self.length = 0
+                    self.state = self.READ_LEN
+                elif self.state == self.READ_LEN:
+                    while self.pos < len(buffer) and 48 <= buffer[self.pos] <= 57:
+                        self.length = self.length * 10 + buffer[self.pos] - 48
+                        self.pos += 1
+                    if self.pos == len(buffer):
+                        break
+                    self.state = self.FIND_EMPTY_LINE
+                elif self.state == self.FIND_EMPTY_LINE:
+                    i = buffer.find(b"\r\n\r\n", self.pos)
+                    if i == -1:
+                        self.pos = max(self.pos, len(buffer) - 3)
+                        break
+                    self.body_start = i + 4
+                    self.state = self.READ_BODY
+                elif self.state == self.READ_BODY:
+                    end = self.body_start + self.length
+                    if len(buffer) < end:
+                        if self.length >= self.PREALLOCATE:
+                            self.body = bytearray(self.length)
+                            self.filled = 0
+                            self.pos = self.body_start
+                            self.state = self.FILL_BODY
+                            continue
+                        break
+                    with view[self.body_start:end] as body:
+                        try:
+                            message = self.decode(body)
+                        except ValueError:
+                            message = None
+                    if message is not None:
+                        messages.append(message)
+                    consumed = self.pos = end
+                    self.state = self.SCAN_HEADER
+                else:
+                    take = min(self.length - self.filled, len(buffer) - self.pos)
+                    self.body[self.filled:self.filled + take] = view[self.pos:self.pos + take]
+                    self.filled += take
+                    consumed = self.pos = self.pos + take
+                    if self.filled < self.length:
+                        break
+                    messages.extend(self._finish_body())
+        if consumed:
+            del buffer[:consumed]
+            self.pos -= consumed
+            self.body_start -= consumed
+        return messages
+
+    def _finish_body(self):
+        body, self.body = self.body, None
+        self.state = self.SCAN_HEADER
+        try:
+            message = self.decode(body)
+        except ValueError:
+            return []
+        return [] if message is None else [message]
+
+    def read_body(self, fd):
+        """In FILL_BODY, read the rest of the body from fd straight into its
+        buffer. Returns the decoded messages, or None at EOF"""
+        with memoryview(self.body) as view:
+            n = os.readv(fd, [view[self.filled:]])
+        if not n:
+            return None
+        self.filled += n
+        if self.filled < self.length:
+            return []
+        return self._finish_body()
+
+class LspClient:
+    """Runs an LSP server over stdio and talks to it from the calling thread.
+
+    Responses are indexed by request id and notifications kept in arrival
+    order, so requests can be pipelined and their responses matched up in
+    any order. Use as a context manager to stop the server on exit.
+
+    With use_socket, the server (elm_lsp --socket-fd=N) talks over one end
+    of a Unix socketpair with 1 MiB buffers instead of stdin/stdout pipes.
+    Pipes are grown to 1 MiB too, but only Linux can resize them; elsewhere
+    they keep their 64 KiB default.
+
+    keep_notifications limits which notification methods are decoded and
+    kept; the rest, such as bulky publishDiagnostics, are dropped without
+    parsing. None keeps everything.
+
+    Without capture_stderr the server logs to /dev/null and read_stderr()
+    returns nothing.
+
+    Waits take a timeout in seconds or an absolute deadline on clock, so a
+    caller timing requests can start the clock before sending.
+    """
+
+    def __init__(self, cmd, root_uri=None, env=None, use_socket=False, keep_notifications=None,
+                 capture_stderr=True, clock=time.monotonic):
+        self.root_uri = root_uri
+        self.clock = clock
+        stderr = subprocess.PIPE if capture_stderr else subprocess.DEVNULL
+        self.keep_notifications = None if keep_notifications is None else set(keep_notifications)
+        self.sock = None
+        if use_socket:
+            self.sock, server_sock = socket.socketpair(socket.AF_UNIX, socket.SOCK_STREAM)
+            for sock in (self.sock, server_sock):
+                sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, SOCKET_BUFFER)
+                sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, SOCKET_BUFFER)
+            with server_sock:
+                self.proc = subprocess.Popen(
+                    [*cmd, f"--socket-fd={server_sock.fileno()}"],
+                    stdin=subprocess.DEVNULL,
+                    stdout=subprocess.DEVNULL,
+                    stderr=stderr,
+                    env=env,
+                    pass_fds=(server_sock.fileno(),)
+                )
+            self.fd = self.write_fd = self.sock.fileno()
+        else:
+            # close_fds=False lets subprocess use posix_spawn instead of
+            # fork + exec. Python fds are non-inheritable by default (PEP 446),
+            # so only the pipes reach the server anyway
+            self.proc = subprocess.Popen(
+                cmd,
+                stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE,
+                stderr=stderr,
+                env=env,
+                close_fds=False
+            )
+            # Read the raw fd with os.read: BufferedReader adds a lock and a
+            # copy per call and buffers nothing the framer needs
+            self.fd = self.proc.stdout.fileno()
+            self.write_fd = self.proc.stdin.fileno()
+            if fcntl and sys.platform.startswith("linux"):
+                for fd in (self.write_fd, self.fd):
+                    try:
+                        fcntl.fcntl(fd, F_SETPIPE_SZ, PIPE_SIZE)
+                    except OSError:
+                        pass  # Above /proc/sys/fs/pipe-max-size; keep the default
+        # Non-blocking, so drain() can empty the pipe and hand back control
+        os.set_blocking(self.fd, False)
+        # Wait on the pipes directly: no reader thread, queue or lock handoffs.
+        # stderr is drained on every wakeup too, so a chatty server never
+        # blocks on a full pipe while logging
+        self.selector = selectors.DefaultSelector()
+        self.selector.register(self.fd, selectors.EVENT_READ)
+        self.stderr_fd = None
+        if capture_stderr:
+            self.stderr_fd = self.proc.stderr.fileno()
+            os.set_blocking(self.stderr_fd, False)
+            self.selector.register(self.stderr_fd, selectors.EVENT_READ)
+        self.stderr_lines = collections.deque(maxlen=STDERR_LINES)
+        self.stderr_partial = b""
+        self.framer = LspFramer(self._decode)
+        self.ids = itertools.count(1)
+        self.responses = {}
+        self.notifications = []
+        self.eof = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+        self.selector.close()
+        if self.sock is not None:
+            self.sock.close()
+
+    def close(self):
+        """Stop the server; stderr stays readable until the client exits"""
+        try:
+            self.proc.terminate()
+            self.proc.wait(timeout=1)
+        except:
+            self.proc.kill()
+
+    def next_id(self):
+        """Reserve a request id, for requests encoded ahead of time"""
+        return next(self.ids)
+
+    def send(self, *frames):
+        """Write encoded frames with a single write syscall"""
+        # Straight to the fd: BufferedWriter.write + flush only adds a copy and
+        # a lock in front of the same write(2)
+        data = memoryview(frames[0] if len(frames) == 1 else b"".join(frames))
+        fd = self.write_fd
+        while data:
+            try:
+                data = data[os.write(fd, data):]
+            except BlockingIOError:
+                # Only the socket transport shares the non-blocking reader fd
+                self._wait_writable()
+
+    def _wait_writable(self):
+        """Block until the socket takes more data, reading meanwhile: the
+        server may itself be stuck writing to us and only drain its end
+        once we drain ours"""
+        self.selector.modify(self.fd, selectors.EVENT_READ | selectors.EVENT_WRITE)
+        try:
+            while not self._poll(None) & selectors.EVENT_WRITE:
+                pass
+        finally:
+            self.selector.modify(self.fd, selectors.EVENT_READ)
+
+    def notify(self, method, params):
+        self.send(encode_lsp({"jsonrpc": "2.0", "method": method, "params": params}))
+
+    def send_request(self, method, params):
+        """Send a request without waiting for it; returns its id"""
+        req_id = self.next_id()
+        self.send(encode_request(req_id, method, params))
+        return req_id
+
+    def request(self, method, params, timeout=5):
+        """Send a request and return its response; None on timeout"""
+        return self.wait(self.send_request(method, params), timeout)
+
+    def initialize(self, capabilities=None, timeout=10):
+        """Run the initialize handshake and return the initialize response"""
+        params = {"processId": os.getpid(), "rootUri": self.root_uri, "capabilities": capabilities or {}}
+        response = self.request("initialize", params, timeout)
+        self.notify("initialized", {})
+        return response
+
+    def _poll(self, timeout):
+        """Wait up to timeout for output and read whatever is ready; returns
+        the events that were ready on the server fd"""
+        ready = 0
+        for key, events in self.selector.select(timeout):
+            if key.fd == self.fd:
+                ready = events
+                if events & selectors.EVENT_READ:
+                    self.drain()
+            else:
+                self._read_stderr()
+        return ready
+
+    def _read_stderr(self):
+        """Move complete log lines from the stderr pipe into the ring buffer"""
+        while True:
+            try:
+                chunk = os.read(self.stderr_fd, READ_SIZE)
+            except BlockingIOError:
+                return
+            if not chunk:
+                self.selector.unregister(self.stderr_fd)
+                if self.stderr_partial:
+                    self.stderr_lines.append(self.stderr_partial)
+                    self.stderr_partial = b""
+                return
+            *lines, self.stderr_partial = (self.stderr_partial + chunk).split(b"\n")
+            self.stderr_lines.extend(lines)
+
+    def _decode(self, body):
+        if self.keep_notifications is not None:
+            head = _METHOD_HEAD.match(body[:128])
+            if head is not None and head.group(1).decode() not in self.keep_notifications:
+                return None
+        return json_loads(body)
+
+    def drain(self):
+        """Read everything available without blocking and dispatch every
+        complete message"""
+        while True:
+            try:
+                if self.framer.state == LspFramer.FILL_BODY and HAVE_READV:
+                    # Large body: read it straight into its preallocated buffer
+                    messages = self.framer.read_body(self.fd)
+                    chunk = None
+                else:
+                    chunk = os.read(self.fd, READ_SIZE)
+                    messages = self.framer.feed(chunk) if chunk else None
+            except BlockingIOError:
+                return
+            if messages is None:
+                self.eof = True
+                return
+            for msg in messages:
+                if "method" in msg:
+                    # Server requests also carry an id but are not responses to ours
+                    if "id" not in msg:
+                        self.notifications.append(msg)
+                else:
+                    self.responses[msg.get("id")] = msg
+            if chunk is not None and len(chunk) < READ_SIZE:
+                return
+
+    def _deadline(self, timeout, deadline):
+        return deadline if deadline is not None else self.clock() + timeout
+
+    def _wait_for(self, take, deadline):
+        # Wait on the pipe itself: the caller wakes as soon as the message is
+        # parsed, with no thread or queue handoff in between
+        while True:
+            message = take()
+            if message is not None:
+                return message
+            remaining = deadline - self.clock()
+            if remaining <= 0 or self.eof:
+                return None
+            self._poll(remaining)
+
+    def wait(self, req_id, timeout=None, deadline=None):
+        """Read until the response to req_id arrives; None on timeout"""
+        return self._wait_for(lambda: self.responses.pop(req_id, None),
+                              self._deadline(timeout, deadline))
+
+    def wait_for_notification(self, method, timeout=None, deadline=None, match=None):
+        """Read until a notification for method that satisfies match arrives
+        and return it; None on timeout. Other notifications are kept"""
+        if self.keep_notifications is not None:
+            # Too late for any already dropped, but catch the next one
+            self.keep_notifications.add(method)
+        checked = 0
+
+        def take():
+            nonlocal checked
+            notifications = self.notifications
+            for i in range(checked, len(notifications)):
+                message = notifications[i]
+                if message["method"] == method and (match is None or match(message)):
+                    return notifications.pop(i)
+            checked = len(notifications)
+            return None
+        return self._wait_for(take, self._deadline(timeout, deadline))
+
+    def discard_notifications(self, method, match=None):
+        """Drop the method notifications that satisfy match, including any
+        already waiting in the pipe"""
+        self.drain()
+        self.notifications = [message for message in self.notifications
+                              if message["method"] != method
+                              or (match is not None and not match(message))]
+
+    def collect(self, ids, timeout):
+        """Gather the responses to the given request ids, keyed by id, until
+        all have arrived or the timeout expires"""
+        collected = {}
+        deadline = self.clock() + timeout
+        for req_id in ids:
+            resp = self.wait(req_id, deadline=deadline)
+            if resp is not None:
+                collected[req_id] = resp
+        return collected
+
+    def read_stderr(self):
+        """Drain what the server has left on stderr without blocking and
+        return the last STDERR_LINES lines it logged"""
+        if self.stderr_fd is not None and self.stderr_fd in self.selector.get_map():
+            self._read_stderr()
+        lines = list(self.stderr_lines)
+        if self.stderr_partial:
+            lines.append(self.stderr_partial)
+        return b"\n".join(lines)
@@ -6,6 +6,7 @@
 import { spawn } from "child_process";
 import { dirname, join } from "path";
 import { fileURLToPath } from "url";
+import { serverEnv } from "../tests/server_env.mjs";
 import { readFileSync } from "fs";
 
 const __filename = fileURLToPath(import.meta.url);
@@ -24,7 +25,7 @@ class DirectLspClient {
     return new Promise((resolve, reject) => {
       this.process = spawn(RUST_LSP_PATH, [], {
         stdio: ["pipe", "pipe", "pipe"],
-        env: { ...process.env, RUST_LOG: "warn" },
+        env: serverEnv({ RUST_LOG: "warn" }),
       });
 
       this.process.stdout.on("data", (data) => {
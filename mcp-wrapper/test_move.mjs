@@ -7,6 +7,7 @@ import { Client } from "@modelcontextprotocol/sdk/client/index.js";
 import { StdioClientTransport } from "@modelcontextprotocol/sdk/client/stdio.js";
 import { dirname, join } from "path";
 import { fileURLToPath } from "url";
+import { serverEnv } from "../tests/server_env.mjs";
 import { readFileSync, writeFileSync, existsSync, copyFileSync } from "fs";
 
 const __filename = fileURLToPath(import.meta.url);
@@ -32,6 +33,7 @@ async function main() {
   const transport = new StdioClientTransport({
     command: "node",
     args: [MCP_SERVER],
+    env: serverEnv(),
   });
 
   const client = new Client(
@@ -13,11 +13,32 @@ async fn main() -> Result<()> {
 
     tracing::info!("Starting Elm Language Server (Rust)");
 
+    let (service, socket) = LspService::new(ElmLanguageServer::new);
+
+    // `--socket-fd=N`: speak LSP over an inherited Unix socket (one end of a
+    // socketpair) instead of stdin/stdout. Pipes default to 64 KiB; with a
+    // socketpair the client picks the buffer sizes
+    #[cfg(unix)]
+    if let Some(fd) = socket_fd_arg() {
+        use std::os::unix::io::FromRawFd;
+
+        // SAFETY: the parent hands us this fd for our exclusive use
+        let stream = unsafe { std::os::unix::net::UnixStream::from_raw_fd(fd) };
+        stream.set_nonblocking(true)?;
+        let (read, write) = tokio::net::UnixStream::from_std(stream)?.into_split();
+        Server::new(read, write, socket).serve(service).await;
+        return Ok(());
+    }
+
     let stdin = tokio::io::stdin();
     let stdout = tokio::io::stdout();
 
-    let (service, socket) = LspService::new(ElmLanguageServer::new);
     Server::new(stdin, stdout, socket).serve(service).await;
 
     Ok(())
 }
+
+#[cfg(unix)]
+fn socket_fd_arg() -> Option<std::os::unix::io::RawFd> {
+    std::env::args().find_map(|arg| arg.strip_prefix("--socket-fd=")?.parse().ok())
+}
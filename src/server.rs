@@ -27,6 +27,21 @@ const CMD_REMOVE_FIELD: &str = "elm.removeField";
 const CMD_PREPARE_ADD_VARIANT: &str = "elm.prepareAddVariant";
 const CMD_ADD_VARIANT: &str = "elm.addVariant";
 
+/// Sent after `initialized` once the workspace index is ready, so clients can
+/// wait for it instead of sleeping
+enum IndexingComplete {}
+
+impl notification::Notification for IndexingComplete {
+    type Params = IndexingCompleteParams;
+    const METHOD: &'static str = "$/elmLsp/indexingComplete";
+}
+
+#[derive(Debug, serde::Serialize, serde::Deserialize)]
+struct IndexingCompleteParams {
+    modules: usize,
+    symbols: usize,
+}
+
 pub struct ElmLanguageServer {
     client: Client,
     documents: DashMap<Url, Document>,
@@ -676,22 +691,35 @@ impl LanguageServer for ElmLanguageServer {
         tracing::info!("initialized: received notification");
 
         // Log workspace status - get message first, then await
-        let message = {
+        let (message, modules, symbols) = {
             if let Ok(ws) = self.workspace.read() {
                 if let Some(workspace) = ws.as_ref() {
-                    format!(
-                        "Elm LSP (Rust) initialized: {} modules indexed",
-                        workspace.modules.len()
+                    (
+                        format!(
+                            "Elm LSP (Rust) initialized: {} modules indexed",
+                            workspace.modules.len()
+                        ),
+                        workspace.modules.len(),
+                        workspace.symbols.values().map(|v| v.len()).sum(),
                     )
                 } else {
-                    "Elm LSP (Rust) initialized (no workspace)".to_string()
+                    (
+                        "Elm LSP (Rust) initialized (no workspace)".to_string(),
+                        0,
+                        0,
+                    )
                 }
             } else {
-                "Elm LSP (Rust) initialized".to_string()
+                ("Elm LSP (Rust) initialized".to_string(), 0, 0)
             }
         };
 
         self.client.log_message(MessageType::INFO, message).await;
+
+        // The index is built in `initialize`, so it is complete by now
+        self.client
+            .send_notification::<IndexingComplete>(IndexingCompleteParams { modules, symbols })
+            .await;
     }
 
     async fn shutdown(&self) -> Result<()> {
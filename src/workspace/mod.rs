@@ -1,3 +1,4 @@
+use std::borrow::Cow;
 use std::collections::HashMap;
 use std::path::{Path, PathBuf};
 use tower_lsp::lsp_types::*;
@@ -68,7 +69,7 @@ pub struct DefinitionSymbol {
 }
 
 /// Global symbol entry in the index
-#[derive(Debug, Clone)]
+#[derive(Debug, Clone, serde::Serialize, serde::Deserialize)]
 pub struct GlobalSymbol {
     pub name: String,
     pub module_name: String,
@@ -78,6 +79,36 @@ pub struct GlobalSymbol {
     pub signature: Option<String>,
 }
 
+/// Bump when the cached external package symbols change shape
+const PACKAGE_CACHE_FORMAT: u32 = 1;
+
+/// Overrides the package symbol cache dir, e.g. to keep test runs out of the user cache
+const PACKAGE_CACHE_DIR_ENV: &str = "ELM_LSP_CACHE_DIR";
+
+/// Set by build.rs: plugin version and git commit, unique per build of a dirty tree
+const BUILD_ID: &str = env!("ELM_LSP_BUILD_ID");
+
+/// Symbols of one external package, persisted so later startups skip parsing it.
+/// An entry is only used by the build that wrote it, for the same source path
+/// and unchanged files. Borrowed when saving, owned when loaded.
+#[derive(serde::Serialize, serde::Deserialize)]
+struct PackageSymbolCache<'a> {
+    format: u32,
+    build_id: Cow<'a, str>,
+    path: Cow<'a, Path>,
+    files: Cow<'a, [PackageFileStamp]>,
+    symbols: Cow<'a, [GlobalSymbol]>,
+}
+
+/// Identity of one .elm file of a package, to notice packages patched in place
+#[derive(Debug, Clone, PartialEq, serde::Serialize, serde::Deserialize)]
+struct PackageFileStamp {
+    /// Relative to the package dir
+    path: PathBuf,
+    mtime_ns: u64,
+    size: u64,
+}
+
 /// Protected files in Lamdera projects that should not be renamed/moved
 const LAMDERA_PROTECTED_FILES: &[&str] = &["Env.elm", "Types.elm", "Frontend.elm", "Backend.elm"];
 
@@ -312,22 +343,38 @@ impl Workspace {
         Ok(())
     }
 
-    /// Index a single external package
+    /// Index a single external package, from the on-disk cache when possible
     fn index_external_package(&mut self, package: &ExternalPackage) -> anyhow::Result<()> {
-        for entry in WalkDir::new(&package.path)
-            .into_iter()
-            .filter_map(|e| e.ok())
-        {
-            let path = entry.path();
-            if path.extension().is_some_and(|ext| ext == "elm") {
-                self.index_external_file(path, &package.name)?;
+        // A stat per file is cheap next to parsing, and catches edited packages
+        let files = Self::package_file_stamps(&package.path)?;
+        if let Some(symbols) = Self::load_package_cache(package, &files) {
+            self.add_external_symbols(symbols);
+            return Ok(());
+        }
+
+        let mut symbols = Vec::new();
+        let mut result = Ok(());
+        for file in &files {
+            result = self.index_external_file(&package.path.join(&file.path), &mut symbols);
+            if result.is_err() {
+                break;
             }
         }
-        Ok(())
+
+        // Only cache complete packages; keep what was indexed either way
+        if result.is_ok() {
+            Self::save_package_cache(package, &files, &symbols);
+        }
+        self.add_external_symbols(symbols);
+        result
     }
 
-    /// Index a single external file (only extracts symbols, no references)
-    fn index_external_file(&mut self, path: &Path, _package_name: &str) -> anyhow::Result<()> {
+    /// Extract the symbols of a single external file (no references)
+    fn index_external_file(
+        &mut self,
+        path: &Path,
+        symbols_out: &mut Vec<GlobalSymbol>,
+    ) -> anyhow::Result<()> {
         let content = std::fs::read_to_string(path)?;
         let uri = Url::from_file_path(path).map_err(|_| anyhow::anyhow!("Invalid path"))?;
 
@@ -342,32 +389,144 @@ impl Workspace {
                         .to_string()
                 });
 
-            // Add symbols to external index (not the main symbols index)
             for symbol in &symbols {
-                let global_symbol = GlobalSymbol {
+                symbols_out.push(GlobalSymbol {
                     name: symbol.name.clone(),
                     module_name: module_name.clone(),
                     kind: symbol.kind,
                     definition_uri: uri.clone(),
                     definition_range: symbol.definition_range.unwrap_or(symbol.range),
                     signature: symbol.signature.clone(),
-                };
+                });
+            }
+        }
 
-                // Index by unqualified name
-                self.external_symbols
-                    .entry(symbol.name.clone())
-                    .or_default()
-                    .push(global_symbol.clone());
+        Ok(())
+    }
 
-                // Index by qualified name
-                let qualified_name = format!("{}.{}", module_name, symbol.name);
-                self.external_symbols
-                    .entry(qualified_name)
-                    .or_default()
-                    .push(global_symbol);
+    /// Add symbols to the external index (not the main symbols index)
+    fn add_external_symbols(&mut self, symbols: Vec<GlobalSymbol>) {
+        for global_symbol in symbols {
+            let qualified_name = format!("{}.{}", global_symbol.module_name, global_symbol.name);
+
+            // Index by unqualified name
+            self.external_symbols
+                .entry(global_symbol.name.clone())
+                .or_default()
+                .push(global_symbol.clone());
+
+            // Index by qualified name
+            self.external_symbols
+                .entry(qualified_name)
+                .or_default()
+                .push(global_symbol);
+        }
+    }
+
+    /// $ELM_LSP_CACHE_DIR, else <user cache dir>/elm-lsp-rust
+    fn package_cache_dir() -> Option<PathBuf> {
+        match std::env::var_os(PACKAGE_CACHE_DIR_ENV) {
+            Some(dir) if !dir.is_empty() => Some(PathBuf::from(dir)),
+            _ => Some(dirs::cache_dir()?.join("elm-lsp-rust")),
+        }
+    }
+
+    /// Cache file for a package: <cache dir>/packages/<author>/<name>/<version>.json
+    fn package_cache_path(cache_dir: &Path, package: &ExternalPackage) -> PathBuf {
+        let mut path = cache_dir.join("packages");
+        for part in package.name.split('/') {
+            path.push(part);
+        }
+        path.push(format!("{}.json", package.version));
+        path
+    }
+
+    /// The package's .elm files, sorted by path, with their mtime and size
+    fn package_file_stamps(package_dir: &Path) -> anyhow::Result<Vec<PackageFileStamp>> {
+        let mut files = Vec::new();
+        for entry in WalkDir::new(package_dir).into_iter().filter_map(|e| e.ok()) {
+            let path = entry.path();
+            if !path.extension().is_some_and(|ext| ext == "elm") {
+                continue;
             }
+            let metadata = entry.metadata()?;
+            let mtime_ns = metadata
+                .modified()
+                .ok()
+                .and_then(|time| time.duration_since(std::time::UNIX_EPOCH).ok())
+                .map_or(0, |age| age.as_nanos() as u64);
+            files.push(PackageFileStamp {
+                path: path.strip_prefix(package_dir)?.to_path_buf(),
+                mtime_ns,
+                size: metadata.len(),
+            });
         }
+        files.sort_by(|a, b| a.path.cmp(&b.path));
+        Ok(files)
+    }
+
+    fn load_package_cache(
+        package: &ExternalPackage,
+        files: &[PackageFileStamp],
+    ) -> Option<Vec<GlobalSymbol>> {
+        Self::load_package_cache_from(&Self::package_cache_dir()?, package, files)
+    }
+
+    fn load_package_cache_from(
+        cache_dir: &Path,
+        package: &ExternalPackage,
+        files: &[PackageFileStamp],
+    ) -> Option<Vec<GlobalSymbol>> {
+        let content = std::fs::read(Self::package_cache_path(cache_dir, package)).ok()?;
+        let cache: PackageSymbolCache = serde_json::from_slice(&content).ok()?;
+        // Another build may extract different symbols, a different ELM_HOME
+        // means different definition URIs, and any added, removed or touched
+        // file means the source changed
+        if cache.format != PACKAGE_CACHE_FORMAT
+            || cache.build_id != BUILD_ID
+            || cache.path != package.path
+            || *cache.files != *files
+        {
+            return None;
+        }
+        Some(cache.symbols.into_owned())
+    }
 
+    /// Best effort: a missing or read-only cache dir only costs a reparse next time
+    fn save_package_cache(
+        package: &ExternalPackage,
+        files: &[PackageFileStamp],
+        symbols: &[GlobalSymbol],
+    ) {
+        let Some(cache_dir) = Self::package_cache_dir() else {
+            return;
+        };
+        if let Err(e) = Self::save_package_cache_to(&cache_dir, package, files, symbols) {
+            tracing::warn!("Failed to cache symbols of {}: {}", package.name, e);
+        }
+    }
+
+    fn save_package_cache_to(
+        cache_dir: &Path,
+        package: &ExternalPackage,
+        files: &[PackageFileStamp],
+        symbols: &[GlobalSymbol],
+    ) -> anyhow::Result<()> {
+        let path = Self::package_cache_path(cache_dir, package);
+        let cache = PackageSymbolCache {
+            format: PACKAGE_CACHE_FORMAT,
+            build_id: Cow::Borrowed(BUILD_ID),
+            path: Cow::Borrowed(package.path.as_path()),
+            files: Cow::Borrowed(files),
+            symbols: Cow::Borrowed(symbols),
+        };
+        if let Some(dir) = path.parent() {
+            std::fs::create_dir_all(dir)?;
+        }
+        // Write then rename, so a concurrent server never reads a partial file
+        let tmp = path.with_extension(format!("json.{}", std::process::id()));
+        std::fs::write(&tmp, serde_json::to_vec(&cache)?)?;
+        std::fs::rename(&tmp, &path)?;
         Ok(())
     }
 
@@ -2582,4 +2741,73 @@ value = help
 
         drop(temp_dir);
     }
+
+    #[test]
+    fn test_package_cache_round_trip() {
+        let elm_home = TempDir::new().unwrap();
+        let cache_dir = TempDir::new().unwrap();
+        let package = ExternalPackage {
+            name: "elm/core".to_string(),
+            version: "1.0.5".to_string(),
+            path: elm_home.path().join("elm").join("core").join("1.0.5"),
+        };
+        let list_path = package.path.join("src").join("List.elm");
+        fs::create_dir_all(list_path.parent().unwrap()).unwrap();
+        fs::write(&list_path, "module List exposing (map)\n").unwrap();
+        let files = Workspace::package_file_stamps(&package.path).unwrap();
+        assert_eq!(files.len(), 1);
+        assert_eq!(files[0].path, Path::new("src").join("List.elm"));
+
+        let symbols = vec![GlobalSymbol {
+            name: "map".to_string(),
+            module_name: "List".to_string(),
+            kind: SymbolKind::FUNCTION,
+            definition_uri: Url::from_file_path(&list_path).unwrap(),
+            definition_range: Range::new(Position::new(3, 0), Position::new(3, 3)),
+            signature: Some("(a -> b) -> List a -> List b".to_string()),
+        }];
+
+        let load = |package: &ExternalPackage, files: &[PackageFileStamp]| {
+            Workspace::load_package_cache_from(cache_dir.path(), package, files)
+        };
+        assert!(load(&package, &files).is_none());
+        Workspace::save_package_cache_to(cache_dir.path(), &package, &files, &symbols).unwrap();
+
+        let cache_file = cache_dir
+            .path()
+            .join("packages")
+            .join("elm")
+            .join("core")
+            .join("1.0.5.json");
+        assert!(cache_file.exists());
+
+        let loaded = load(&package, &files).unwrap();
+        assert_eq!(loaded.len(), 1);
+        assert_eq!(loaded[0].name, "map");
+        assert_eq!(loaded[0].module_name, "List");
+        assert_eq!(loaded[0].kind, SymbolKind::FUNCTION);
+        assert_eq!(loaded[0].definition_uri, symbols[0].definition_uri);
+        assert_eq!(loaded[0].definition_range, symbols[0].definition_range);
+        assert_eq!(loaded[0].signature, symbols[0].signature);
+
+        // Packages unpacked under another ELM_HOME are not served from the cache
+        let moved = ExternalPackage {
+            path: elm_home.path().join("elsewhere"),
+            ..package.clone()
+        };
+        assert!(load(&moved, &files).is_none());
+
+        // Nor are packages patched in place
+        fs::write(&list_path, "module List exposing (map, filter)\n").unwrap();
+        let patched = Workspace::package_file_stamps(&package.path).unwrap();
+        assert_ne!(patched, files);
+        assert!(load(&package, &patched).is_none());
+
+        // Nor entries written by another build
+        let mut cache: serde_json::Value =
+            serde_json::from_slice(&fs::read(&cache_file).unwrap()).unwrap();
+        cache["build_id"] = serde_json::json!("0.0.0+other");
+        fs::write(&cache_file, serde_json::to_vec(&cache).unwrap()).unwrap();
+        assert!(load(&package, &files).is_none());
+    }
 }
@@ -2,6 +2,7 @@ import { spawn } from 'child_process';
 import * as fs from 'fs';
 import * as path from 'path';
 import { fileURLToPath } from 'url';
+import { serverEnv } from './server_env.mjs';
 
 const __filename = fileURLToPath(import.meta.url);
 const __dirname = path.dirname(__filename);
@@ -26,7 +27,7 @@ async function runEdgeCaseTests() {
 
     const server = spawn(serverPath, ['--stdio'], {
         cwd: projectDir,
-        env: { ...process.env, RUST_LOG: 'error' }
+        env: serverEnv({ RUST_LOG: 'error' })
     });
 
     let buffer = '';
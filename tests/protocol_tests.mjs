@@ -0,0 +1,190 @@
+import { spawn } from 'child_process';
+import * as path from 'path';
+import { fileURLToPath } from 'url';
+import { serverEnv } from './server_env.mjs';
+
+const __filename = fileURLToPath(import.meta.url);
+const __dirname = path.dirname(__filename);
+const projectDir = path.join(__dirname, 'fixture');
+const serverPath = path.join(__dirname, '..', 'target', 'release', 'elm_lsp');
+
+const INDEXING_COMPLETE = '$/elmLsp/indexingComplete';
+
+// Speak LSP over any pair of streams, keeping notifications so tests can
+// assert on the ones the server sends unprompted
+function connect(input, output) {
+    let buffer = Buffer.alloc(0);
+    let requestId = 1;
+    const pending = new Map();
+    const notifications = [];
+    const waiters = [];
+
+    // A server that dies shows up as a timeout, not an EPIPE crash
+    input.on('error', () => {});
+
+    output.on('data', (data) => {
+        buffer = Buffer.concat([buffer, data]);
+        while (true) {
+            const headerEnd = buffer.indexOf('\r\n\r\n');
+            if (headerEnd === -1) break;
+            const match = buffer.slice(0, headerEnd).toString().match(/Content-Length: (\d+)/);
+            if (!match) break;
+            const start = headerEnd + 4;
+            const len = parseInt(match[1]);
+            if (buffer.length < start + len) break;
+            const msg = JSON.parse(buffer.slice(start, start + len).toString());
+            buffer = buffer.slice(start + len);
+            if (msg.method === undefined) {
+                const resolve = pending.get(msg.id);
+                if (resolve) {
+                    pending.delete(msg.id);
+                    resolve(msg);
+                }
+            } else if (msg.id === undefined) {
+                notifications.push(msg);
+                for (const waiter of waiters.filter(w => w.method === msg.method)) {
+                    waiters.splice(waiters.indexOf(waiter), 1);
+                    waiter.resolve(msg);
+                }
+            }
+        }
+    });
+
+    function write(msg) {
+        const body = JSON.stringify({ jsonrpc: "2.0", ...msg });
+        input.write(`Content-Length: ${Buffer.byteLength(body)}\r\n\r\n${body}`);
+    }
+
+    function withTimeout(promise, timeout, what, cancel) {
+        let timer;
+        const expired = new Promise((_, reject) => {
+            timer = setTimeout(() => {
+                cancel();
+                reject(new Error(`Timeout waiting for ${what}`));
+            }, timeout);
+        });
+        return Promise.race([promise, expired]).finally(() => clearTimeout(timer));
+    }
+
+    return {
+        notifications,
+        request(method, params, timeout = 30000) {
+            const id = requestId++;
+            const response = new Promise(resolve => pending.set(id, resolve));
+            write({ id, method, params });
+            return withTimeout(response, timeout, `response to ${method}`, () => pending.delete(id));
+        },
+        notify(method, params) {
+            write({ method, params });
+        },
+        waitForNotification(method, timeout = 30000) {
+            const seen = notifications.find(n => n.method === method);
+            if (seen) return Promise.resolve(seen);
+            const waiter = { method };
+            const notification = new Promise(resolve => { waiter.resolve = resolve; });
+            waiters.push(waiter);
+            return withTimeout(notification, timeout, method,
+                () => waiters.splice(waiters.indexOf(waiter), 1));
+        },
+    };
+}
+
+async function runProtocolTests() {
+    console.log("\n\x1b[1m======================================================================\x1b[0m");
+    console.log("\x1b[1m  Protocol Tests\x1b[0m");
+    console.log("\x1b[1m======================================================================\x1b[0m\n");
+
+    let passed = 0;
+    let failed = 0;
+
+    function check(ok, message) {
+        if (ok) {
+            console.log(`  \x1b[32m✓\x1b[0m ${message}`);
+            passed++;
+        } else {
+            console.log(`  \x1b[31m✗\x1b[0m ${message}`);
+            failed++;
+        }
+    }
+
+    // Test 1: indexing-complete notification over stdio
+    console.log("\x1b[36mProtocol 1: $/elmLsp/indexingComplete follows initialized\x1b[0m");
+    const server = spawn(serverPath, ['--stdio'], {
+        cwd: projectDir,
+        env: serverEnv({ RUST_LOG: 'error' })
+    });
+    try {
+        const lsp = connect(server.stdin, server.stdout);
+        await lsp.request('initialize', {
+            processId: process.pid,
+            rootUri: `file://${projectDir}`,
+            capabilities: {}
+        });
+        check(!lsp.notifications.some(n => n.method === INDEXING_COMPLETE),
+            "No indexingComplete before initialized");
+        lsp.notify('initialized', {});
+        const { params } = await lsp.waitForNotification(INDEXING_COMPLETE);
+        check(params.modules >= 5, `Indexed ${params.modules} fixture modules`);
+        check(params.symbols > 0, `Indexed ${params.symbols} symbols`);
+    } catch (e) {
+        console.log(`  \x1b[31m✗\x1b[0m Exception: ${e.message}`);
+        failed++;
+    } finally {
+        server.kill();
+    }
+
+    // Test 2: the same session over an inherited Unix socket (--socket-fd=N)
+    console.log("\x1b[36mProtocol 2: --socket-fd=3 talks LSP over the passed socket\x1b[0m");
+    if (process.platform === 'win32') {
+        console.log("  \x1b[33m⚠\x1b[0m Skipped: Unix sockets only");
+    } else {
+        // libuv creates 'pipe' stdio entries as socketpairs on Unix, so fd 3
+        // is one end of a Unix socket and stdio[3] the other
+        const socketServer = spawn(serverPath, ['--socket-fd=3'], {
+            cwd: projectDir,
+            env: serverEnv({ RUST_LOG: 'error' }),
+            stdio: ['ignore', 'pipe', 'ignore', 'pipe']
+        });
+        try {
+            let stdoutBytes = 0;
+            socketServer.stdout.on('data', (data) => { stdoutBytes += data.length; });
+
+            const socket = socketServer.stdio[3];
+            const lsp = connect(socket, socket);
+            const init = await lsp.request('initialize', {
+                processId: process.pid,
+                rootUri: `file://${projectDir}`,
+                capabilities: {}
+            });
+            check(init.result && init.result.capabilities, "initialize answered over the socket");
+            lsp.notify('initialized', {});
+            const { params } = await lsp.waitForNotification(INDEXING_COMPLETE);
+            check(params.modules >= 5, `indexingComplete over the socket (${params.modules} modules)`);
+            const symbols = await lsp.request('textDocument/documentSymbol', {
+                textDocument: { uri: `file://${path.join(projectDir, 'src/Main.elm')}` }
+            });
+            check(Array.isArray(symbols.result) && symbols.result.length > 0,
+                "documentSymbol answered over the socket");
+            check(stdoutBytes === 0, "Nothing written to stdout");
+        } catch (e) {
+            console.log(`  \x1b[31m✗\x1b[0m Exception: ${e.message}`);
+            failed++;
+        } finally {
+            socketServer.kill();
+        }
+    }
+
+    console.log("\n\x1b[1m======================================================================\x1b[0m");
+    console.log("\x1b[1m  Protocol Summary\x1b[0m");
+    console.log("\x1b[1m======================================================================\x1b[0m");
+    console.log(`  \x1b[32mPassed: ${passed}\x1b[0m`);
+    console.log(`  \x1b[31mFailed: ${failed}\x1b[0m`);
+    console.log(`  Total:  ${passed + failed}\n`);
+
+    process.exit(failed > 0 ? 1 : 0);
+}
+
+runProtocolTests().catch(e => {
+    console.error(e);
+    process.exit(1);
+});
@@ -230,6 +230,7 @@ async function main() {
 
   const fixtureTestPath = join(__dirname, "run_tests.mjs");
   const meetdownTestPath = join(__dirname, "test_meetdown_comprehensive.mjs");
+  const protocolTestPath = join(__dirname, "protocol_tests.mjs");
 
   // Run fixture tests
   console.log(`${CYAN}Running fixture tests...${RESET}\n`);
@@ -240,12 +241,16 @@ async function main() {
   const meetdownResults = await runTest(meetdownTestPath, "Meetdown Tests");
   const meetdownCoverage = parseCoverageFromOutput(meetdownResults.output);
 
+  // LSP protocol extensions; no MCP tools, so nothing for the coverage file
+  console.log(`\n${CYAN}Running protocol tests...${RESET}\n`);
+  const protocolResults = await runTest(protocolTestPath, "Protocol Tests");
+
   // Generate coverage file from test data
   generateCoverageFile(fixtureResults, meetdownResults, fixtureCoverage, meetdownCoverage);
 
   // Final summary
-  const totalPassed = fixtureResults.passed + meetdownResults.passed;
-  const totalFailed = fixtureResults.failed + meetdownResults.failed;
+  const totalPassed = fixtureResults.passed + meetdownResults.passed + protocolResults.passed;
+  const totalFailed = fixtureResults.failed + meetdownResults.failed + protocolResults.failed;
 
   console.log(`\n${BOLD}${"=".repeat(70)}${RESET}`);
   console.log(`${BOLD}  Master Test Summary${RESET}`);
@@ -258,6 +263,10 @@ async function main() {
   console.log(`    ${GREEN}Passed: ${meetdownResults.passed}${RESET}`);
   console.log(`    ${meetdownResults.failed > 0 ? RED : GREEN}Failed: ${meetdownResults.failed}${RESET}`);
 
+  console.log(`\n  ${BOLD}Protocol Tests:${RESET}`);
+  console.log(`    ${GREEN}Passed: ${protocolResults.passed}${RESET}`);
+  console.log(`    ${protocolResults.failed > 0 ? RED : GREEN}Failed: ${protocolResults.failed}${RESET}`);
+
   console.log(`\n  ${BOLD}Total:${RESET}`);
   console.log(`    ${GREEN}Passed: ${totalPassed}${RESET}`);
   console.log(`    ${totalFailed > 0 ? RED : GREEN}Failed: ${totalFailed}${RESET}`);
@@ -19,6 +19,7 @@ import { dirname, join } from "path";
 import { fileURLToPath } from "url";
 import { readFileSync, writeFileSync, existsSync, copyFileSync, rmSync, mkdirSync } from "fs";
 import { execSync } from "child_process";
+import { serverEnv } from "./server_env.mjs";
 
 const __filename = fileURLToPath(import.meta.url);
 const __dirname = dirname(__filename);
@@ -1154,6 +1155,7 @@ async function runTests() {
     command: "node",
     args: [MCP_SERVER],
     cwd: FIXTURE_DIR,
+    env: serverEnv(),
   });
 
   client = new Client(
@@ -0,0 +1,16 @@
+/**
+ * Environment for every elm_lsp a test suite starts, directly or through the
+ * MCP wrapper: the package symbol cache goes to a temp dir removed on exit,
+ * so test runs never write to the user's cache
+ */
+
+import { mkdtempSync, rmSync } from "fs";
+import { tmpdir } from "os";
+import { join } from "path";
+
+const cacheDir = mkdtempSync(join(tmpdir(), "elm-lsp-cache-"));
+process.on("exit", () => rmSync(cacheDir, { recursive: true, force: true }));
+
+export function serverEnv(extra = {}) {
+  return { ...process.env, ELM_LSP_CACHE_DIR: cacheDir, ...extra };
+}
@@ -7,6 +7,7 @@ import { spawn } from "child_process";
 import { readFileSync, writeFileSync, existsSync } from "fs";
 import { join, dirname } from "path";
 import { fileURLToPath } from "url";
+import { serverEnv } from "./server_env.mjs";
 import { execSync } from "child_process";
 
 const __filename = fileURLToPath(import.meta.url);
@@ -46,7 +47,7 @@ class LspClient {
     return new Promise((resolve, reject) => {
       this.process = spawn(RUST_LSP_PATH, [], {
         stdio: ["pipe", "pipe", "pipe"],
-        env: { ...process.env, RUST_LOG: "warn" },
+        env: serverEnv({ RUST_LOG: "warn" }),
       });
 
       this.process.stdout.on("data", (data) => this.handleData(data.toString()));
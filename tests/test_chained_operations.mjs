@@ -8,6 +8,7 @@ import { spawn } from "child_process";
 import { readFileSync, writeFileSync, existsSync, mkdirSync, rmSync, renameSync } from "fs";
 import { join, dirname } from "path";
 import { fileURLToPath } from "url";
+import { serverEnv } from "./server_env.mjs";
 
 const __filename = fileURLToPath(import.meta.url);
 const __dirname = dirname(__filename);
@@ -25,7 +26,7 @@ class LSPClient {
 
   async start(root) {
     return new Promise((resolve, reject) => {
-      this.process = spawn(LSP_PATH, [], { stdio: ["pipe", "pipe", "pipe"] });
+      this.process = spawn(LSP_PATH, [], { stdio: ["pipe", "pipe", "pipe"], env: serverEnv() });
       this.process.stdout.on("data", d => this.handleData(d.toString()));
       this.process.stderr.on("data", d => {});
 
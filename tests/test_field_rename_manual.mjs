@@ -11,6 +11,7 @@ import { Client } from "@modelcontextprotocol/sdk/client/index.js";
 import { StdioClientTransport } from "@modelcontextprotocol/sdk/client/stdio.js";
 import { dirname, join } from "path";
 import { fileURLToPath } from "url";
+import { serverEnv } from "./server_env.mjs";
 import { readFileSync } from "fs";
 import { execSync } from "child_process";
 
@@ -32,7 +33,7 @@ async function main() {
   const transport = new StdioClientTransport({
     command: "node",
     args: [MCP_SERVER],
-    env: { ...process.env, ELM_LSP_LOG: "debug" },
+    env: serverEnv({ ELM_LSP_LOG: "debug" }),
   });
   const client = new Client({ name: "test-client", version: "1.0.0" }, {});
   await client.connect(transport);
@@ -2,6 +2,7 @@ import { spawn, execSync } from "child_process";
 import { readFileSync, writeFileSync, copyFileSync, existsSync, mkdirSync, rmSync, readdirSync, statSync, renameSync } from "fs";
 import { join, dirname } from "path";
 import { fileURLToPath } from "url";
+import { serverEnv } from "./server_env.mjs";
 
 const __filename = fileURLToPath(import.meta.url);
 const __dirname = dirname(__filename);
@@ -20,7 +21,10 @@ class LSPClient {
 
   async start(root) {
     return new Promise((resolve, reject) => {
-      this.process = spawn(LSP_PATH, [], { stdio: ["pipe", "pipe", "pipe"] });
+      this.process = spawn(LSP_PATH, [], {
+        stdio: ["pipe", "pipe", "pipe"],
+        env: serverEnv(),
+      });
       this.process.stdout.on("data", d => this.handleData(d.toString()));
       this.process.stderr.on("data", d => {}); // Suppress debug output
 
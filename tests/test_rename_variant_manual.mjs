@@ -2,13 +2,14 @@ import { Client } from "@modelcontextprotocol/sdk/client/index.js";
 import { StdioClientTransport } from "@modelcontextprotocol/sdk/client/stdio.js";
 import { dirname, join } from "path";
 import { fileURLToPath } from "url";
+import { serverEnv } from "./server_env.mjs";
 
 const __filename = fileURLToPath(import.meta.url);
 const __dirname = dirname(__filename);
 const PROJECT_ROOT = dirname(__dirname);
 const MEETDOWN = join(PROJECT_ROOT, "tests/meetdown");
 
-const transport = new StdioClientTransport({ command: "node", args: [join(PROJECT_ROOT, "mcp-wrapper/index.mjs")] });
+const transport = new StdioClientTransport({ command: "node", args: [join(PROJECT_ROOT, "mcp-wrapper/index.mjs")], env: serverEnv() });
 const client = new Client({ name: "test", version: "1.0.0" }, { capabilities: {} });
 
 await client.connect(transport);